@@ -5,19 +5,134 @@ Fetches Google Trends data and formats it for TradingView Pine Seeds consumption
 """
 
 import os
+import sys
 import csv
+import json
 import time
+import subprocess
+import importlib.util
 import random
+from collections import deque
 from datetime import datetime, timedelta
-from typing import List, Tuple, Dict
+from typing import List, Tuple, Dict, Optional
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+if importlib.util.find_spec('pytrends') is None:
+    print("Installing pytrends...")
+    subprocess.check_call([sys.executable, '-m', 'pip', 'install', '--quiet',
+                           '--disable-pip-version-check', '--no-input', 'pytrends'])
+from pytrends.request import TrendReq
+from pytrends.exceptions import ResponseError, TooManyRequestsError
 
 try:
-    from pytrends.request import TrendReq
+    import requests_cache
 except ImportError:
-    print("Installing pytrends...")
-    os.system("pip install pytrends")
-    from pytrends.request import TrendReq
+    # Optional: without it every run goes to Google
+    requests_cache = None
+
+
+# (Pine Seeds symbol, Google Trends search term) pairs
+SEARCH_TERMS = (
+    ('GOOGL_TRENDS_BITCOIN', 'bitcoin'),
+    ('GOOGL_TRENDS_STOCK_MARKET', 'stock market'),
+    ('GOOGL_TRENDS_RECESSION', 'recession'),
+    ('GOOGL_TRENDS_INFLATION', 'inflation'),
+    ('GOOGL_TRENDS_CRYPTOCURRENCY', 'cryptocurrency'),
+)
+
+# Pine Seeds limit on data points per series
+MAX_DATA_POINTS = 6000
+
+# Adaptive request delay (AIMD): shrink additively on success, grow
+# multiplicatively when Google answers with HTTP 429
+INITIAL_DELAY = 2.0
+MIN_DELAY = 1.0
+MAX_DELAY = 60.0
+DELAY_DECREASE = 0.5
+DELAY_BACKOFF = 2.0
+
+# Retries for a single payload; 429s back off exponentially with full jitter
+MAX_RETRIES = 5
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 60.0
+
+# On-disk HTTP response cache, matching Google's daily update cadence. Only
+# local re-runs benefit: CI starts from a fresh checkout without it
+CACHE_NAME = 'trends_cache'
+CACHE_EXPIRE_SECONDS = 24 * 60 * 60
+
+# 'today 5-y' returns weekly points stamped with the start of the week, and
+# the in-progress week is not stored. The next final point therefore exists
+# once the week after the latest stored one has ended
+REFRESH_INTERVAL_SECONDS = 14 * 24 * 60 * 60
+
+# Content types Google uses for JSON API responses
+JSON_CONTENT_TYPES = ('application/json', 'application/javascript', 'text/javascript')
+
+
+def build_session() -> requests.Session:
+    """
+    Build a keep-alive HTTP session shared by all Google Trends requests.
+    
+    Responses are cached on disk for a day when requests-cache is installed.
+    
+    Returns:
+        requests.Session with a pooled, retrying HTTPS adapter
+    """
+    # Only transient server errors are retried here; 429s go straight back to
+    # the adaptive delay and jittered backoff in GoogleTrendsFetcher
+    retry = Retry(total=3, backoff_factor=0.3,
+                  status_forcelist=[502, 503, 504],
+                  allowed_methods=frozenset(['GET', 'POST']),
+                  raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=10, pool_maxsize=10, max_retries=retry)
+    
+    if requests_cache is not None:
+        session = requests_cache.CachedSession(cache_name=CACHE_NAME, backend='sqlite',
+                                               expire_after=CACHE_EXPIRE_SECONDS,
+                                               allowable_methods=('GET', 'POST'))
+    else:
+        session = requests.Session()
+    session.mount('https://', adapter)
+    session.headers['Accept-Encoding'] = 'gzip, deflate'
+    return session
+
+
+class PooledTrendReq(TrendReq):
+    """TrendReq that sends every request through a shared requests.Session."""
+    
+    def __init__(self, session: requests.Session, **kwargs):
+        """
+        Initialize the client.
+        
+        Args:
+            session: Session reused for all API calls
+            **kwargs: Passed through to TrendReq
+        """
+        self.session = session
+        super().__init__(**kwargs)
+    
+    def _get_data(self, url, method=TrendReq.GET_METHOD, trim_chars=0, **kwargs):
+        """
+        Send a request to Google and return the decoded JSON response.
+        
+        pytrends opens a new session (and TCP+TLS connection) on every call;
+        this override reuses the pooled session instead.
+        """
+        send = self.session.post if method == TrendReq.POST_METHOD else self.session.get
+        response = send(url, timeout=self.timeout, cookies=self.cookies,
+                        headers=self.headers, **kwargs, **self.requests_args)
+        
+        content_type = response.headers.get('Content-Type', '')
+        if response.status_code == 200 and any(t in content_type for t in JSON_CONTENT_TYPES):
+            # Some responses start with garbage characters like ")]}',"
+            return json.loads(response.text[trim_chars:])
+        
+        if response.status_code == requests.codes.too_many_requests:
+            raise TooManyRequestsError.from_response(response)
+        raise ResponseError.from_response(response)
 
 
 class GoogleTrendsFetcher:
@@ -26,62 +141,161 @@ class GoogleTrendsFetcher:
     def __init__(self):
         """Initialize the Google Trends fetcher."""
         try:
-            # Add random user agent to avoid blocking
-            self.pytrends = TrendReq(hl='en-US', tz=360, timeout=(10,25), retries=3, backoff_factor=0.1)
-            self.search_terms = {
-                'GOOGL_TRENDS_BITCOIN': 'bitcoin',
-                'GOOGL_TRENDS_STOCK_MARKET': 'stock market',
-                'GOOGL_TRENDS_RECESSION': 'recession',
-                'GOOGL_TRENDS_INFLATION': 'inflation',
-                'GOOGL_TRENDS_CRYPTOCURRENCY': 'cryptocurrency'
-            }
+            self.delay = INITIAL_DELAY
+            self.session = build_session()
+            self.search_terms = SEARCH_TERMS
+            # The client is created on first fetch, since each TrendReq costs
+            # a cookie request to Google
+            self._pytrends = None
+            self.initialized = True
         except Exception as e:
             print(f"Error initializing TrendReq: {e}")
-            self.pytrends = None
+            self.initialized = False
+    
+    def _get_client(self) -> TrendReq:
+        """Return the TrendReq client, creating it on first use."""
+        if self._pytrends is None:
+            self._pytrends = PooledTrendReq(self.session, hl='en-US', tz=360, timeout=(10,25))
+        return self._pytrends
+    
+    def _record_success(self):
+        """Additively decrease the request delay after a successful fetch."""
+        self.delay = max(MIN_DELAY, self.delay - DELAY_DECREASE)
+    
+    def _record_rate_limit(self, error: TooManyRequestsError):
+        """
+        Multiplicatively increase the request delay after an HTTP 429.
         
-    def fetch_trends_data(self, keyword: str, timeframe: str = 'today 5-y') -> List[Tuple[int, float]]:
+        Args:
+            error: The rate limit error raised by pytrends; its Retry-After
+                header is honoured when present
         """
-        Fetch Google Trends data for a specific keyword.
+        retry_after = 0.0
+        response = getattr(error, 'response', None)
+        if response is not None:
+            try:
+                retry_after = float(response.headers.get('Retry-After', 0))
+            except ValueError:
+                # Retry-After may also be an HTTP date; ignore that form
+                retry_after = 0.0
+        
+        self.delay = min(MAX_DELAY, max(self.delay * DELAY_BACKOFF, retry_after))
+        
+    def _request_interest_over_time(self, kw_list: List[str], timeframe: str):
+        """
+        Request interest over time, retrying on failure.
+        
+        HTTP 429 responses are retried with exponential backoff and full
+        jitter; other errors are retried without growing the backoff.
         
         Args:
-            keyword: Search term to fetch trends for
+            kw_list: Search terms to include in the payload
+            timeframe: Time range for the data
+            
+        Returns:
+            DataFrame from pytrends, or None if every attempt failed
+        """
+        pytrends = self._get_client()
+        backoff_exponent = 0
+        
+        for attempt in range(1, MAX_RETRIES + 1):
+            # Adaptive delay to avoid rate limiting
+            delay = self.delay
+            print(f"Waiting {delay:.1f} seconds to avoid rate limiting...")
+            time.sleep(delay)
+            
+            try:
+                pytrends.build_payload(kw_list, cat=0, timeframe=timeframe, geo='', gprop='')
+                interest_over_time_df = pytrends.interest_over_time()
+            except TooManyRequestsError as e:
+                self._record_rate_limit(e)
+                if attempt == MAX_RETRIES:
+                    # No retry follows, so don't wait out a backoff
+                    print(f"Rate limited by Google (attempt {attempt}/{MAX_RETRIES})")
+                    break
+                backoff = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** backoff_exponent))
+                backoff_exponent += 1
+                print(f"Rate limited by Google (attempt {attempt}/{MAX_RETRIES}), "
+                      f"retrying in {backoff:.1f} seconds")
+                time.sleep(backoff)
+                continue
+            except Exception as e:
+                # Network errors are not rate limiting; don't escalate the backoff
+                backoff_exponent = 0
+                print(f"Request failed (attempt {attempt}/{MAX_RETRIES}): {str(e)}")
+                continue
+            
+            self._record_success()
+            return interest_over_time_df
+        
+        print(f"Giving up on {', '.join(kw_list)} after {MAX_RETRIES} attempts")
+        return None
+    
+    def fetch_trends_batch(self, keywords: List[str], timeframe: str = 'today 5-y') -> Dict[str, List[Tuple[int, float]]]:
+        """
+        Fetch Google Trends data for several keywords in a single request.
+        
+        Google scales all keywords of one payload against the same peak, so
+        values are only comparable within the batch; pass a single keyword to
+        get a series scaled 0-100 on its own.
+        
+        Args:
+            keywords: Search terms to fetch trends for (at most 5)
             timeframe: Time range for the data (default: 'today 5-y')
             
         Returns:
-            List of tuples containing (unix_timestamp, trend_value)
+            Dictionary mapping each keyword to (unix_timestamp, trend_value) tuples;
+            keywords without data are omitted
         """
-        if not self.pytrends:
-            print(f"TrendReq not initialized, skipping {keyword}")
-            return []
+        if not self.initialized:
+            print(f"TrendReq not initialized, skipping {', '.join(keywords)}")
+            return {}
             
         try:
-            print(f"Fetching data for: {keyword}")
+            print(f"Fetching data for: {', '.join(keywords)}")
             
-            # Add random delay to avoid rate limiting
-            delay = random.uniform(10, 20)
-            print(f"Waiting {delay:.1f} seconds to avoid rate limiting...")
-            time.sleep(delay)
+            interest_over_time_df = self._request_interest_over_time(keywords, timeframe)
+            if interest_over_time_df is None:
+                return {}
             
-            self.pytrends.build_payload([keyword], cat=0, timeframe=timeframe, geo='', gprop='')
-            interest_over_time_df = self.pytrends.interest_over_time()
+            # The last row is the in-progress period, which Google revises
+            # daily; keep only final values
+            if 'isPartial' in interest_over_time_df.columns:
+                interest_over_time_df = interest_over_time_df[~interest_over_time_df['isPartial'].astype(bool)]
             
             if interest_over_time_df.empty:
-                print(f"No data found for keyword: {keyword}")
-                return []
+                print(f"No data found for keywords: {', '.join(keywords)}")
+                return {}
             
-            # Convert to Pine Seeds format
-            data = []
-            for index, row in interest_over_time_df.iterrows():
-                unix_timestamp = int(index.timestamp())
-                trend_value = float(row[keyword])
-                data.append((unix_timestamp, trend_value))
+            # Convert to Pine Seeds format with whole-column array conversions
+            timestamps = interest_over_time_df.index.to_numpy(dtype='datetime64[s]').astype('int64').tolist()
+            results = {}
+            for keyword in keywords:
+                if keyword not in interest_over_time_df.columns:
+                    print(f"No data found for keyword: {keyword}")
+                    continue
+                values = interest_over_time_df[keyword].to_numpy(dtype='float64')
+                results[keyword] = list(zip(timestamps, values.tolist()))
+                print(f"Successfully fetched {len(timestamps)} data points for {keyword}")
             
-            print(f"Successfully fetched {len(data)} data points for {keyword}")
-            return data
+            return results
             
         except Exception as e:
-            print(f"Error fetching data for {keyword}: {str(e)}")
-            return []
+            print(f"Error fetching data for {', '.join(keywords)}: {str(e)}")
+            return {}
+    
+    def fetch_trends_data(self, keyword: str, timeframe: str = 'today 5-y') -> List[Tuple[int, float]]:
+        """
+        Fetch Google Trends data for a specific keyword.
+        
+        Args:
+            keyword: Search term to fetch trends for
+            timeframe: Time range for the data (default: 'today 5-y')
+            
+        Returns:
+            List of tuples containing (unix_timestamp, trend_value)
+        """
+        return self.fetch_trends_batch([keyword], timeframe).get(keyword, [])
     
     def save_to_csv(self, data: List[Tuple[int, float]], filename: str) -> bool:
         """
@@ -98,16 +312,16 @@ class GoogleTrendsFetcher:
             os.makedirs('data', exist_ok=True)
             filepath = os.path.join('data', filename)
             
+            # pytrends returns data in chronological order; keep only the
+            # latest 6000 data points (Pine Seeds limit) in a single pass
+            limited_data = deque(data, maxlen=MAX_DATA_POINTS)
+            
+            # Rows are plain numbers and need no CSV quoting, so format them
+            # directly and write the whole file in one call. Trends scores are
+            # whole numbers; ':g' writes 45 rather than 45.0 to keep files small
+            rows = ''.join(f"{timestamp},{value:g}\n" for timestamp, value in limited_data)
             with open(filepath, 'w', newline='') as csvfile:
-                writer = csv.writer(csvfile)
-                writer.writerow(['time', 'close'])  # Pine Seeds header format
-                
-                # Sort by timestamp and limit to 6000 data points (Pine Seeds limit)
-                sorted_data = sorted(data, key=lambda x: x[0])
-                limited_data = sorted_data[-6000:] if len(sorted_data) > 6000 else sorted_data
-                
-                for timestamp, value in limited_data:
-                    writer.writerow([timestamp, value])
+                csvfile.write('time,close\n' + rows)  # Pine Seeds header format
             
             print(f"Successfully saved {len(limited_data)} data points to {filepath}")
             return True
@@ -116,20 +330,62 @@ class GoogleTrendsFetcher:
             print(f"Error saving data to {filename}: {str(e)}")
             return False
     
+    def latest_timestamp(self, filename: str) -> Optional[int]:
+        """
+        Read the most recent timestamp from an existing CSV file.
+        
+        Args:
+            filename: CSV filename inside the data directory
+            
+        Returns:
+            Latest unix timestamp, or None if the file is missing or unreadable
+        """
+        filepath = os.path.join('data', filename)
+        latest = None
+        
+        try:
+            with open(filepath, 'r', newline='') as csvfile:
+                reader = csv.reader(csvfile)
+                next(reader, None)  # Skip header
+                for row in reader:
+                    if row:
+                        latest = int(row[0])
+        except (OSError, ValueError):
+            return None
+        
+        return latest
+    
+    def is_up_to_date(self, symbol: str) -> bool:
+        """
+        Check whether a symbol's CSV already holds the latest final weekly point.
+        
+        Args:
+            symbol: Pine Seeds symbol name
+            
+        Returns:
+            True if the series does not need to be fetched again yet
+        """
+        latest = self.latest_timestamp(f"{symbol}.csv")
+        return latest is not None and time.time() - latest < REFRESH_INTERVAL_SECONDS
+    
     def fetch_all_trends(self) -> Dict[str, bool]:
         """
         Fetch all configured Google Trends data.
         
+        Each search term gets its own payload so every series is scaled 0-100
+        on its own, which the Pine indicators' thresholds rely on. Series that
+        already hold the latest final point are not fetched.
+        
         Returns:
             Dictionary with results for each search term
         """
         results = {}
         
-        # Fetch only 2-3 terms to avoid rate limiting on first run
-        limited_terms = dict(list(self.search_terms.items())[:3])
-        
-        for symbol, keyword in limited_terms.items():
-            print(f"Fetching trends data for: {keyword} ({symbol})")
+        for symbol, keyword in self.search_terms:
+            if self.is_up_to_date(symbol):
+                print(f"{symbol} is up to date, skipping fetch")
+                results[symbol] = True
+                continue
             
             data = self.fetch_trends_data(keyword)
             if data:
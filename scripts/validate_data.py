@@ -7,8 +7,54 @@ Validates that CSV files conform to Pine Seeds requirements.
 import os
 import csv
 import sys
+import json
+import mmap
+import time
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-from typing import List, Tuple, Dict
+from functools import partial
+from typing import List, Tuple, Dict, Optional
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+# Series hold final weekly points stamped with the week's start, so the
+# latest point is normally 7-14 days old
+MAX_AGE_DAYS = 14
+
+# Validating a 6000-row file takes ~3 ms, so worker processes only pay off
+# for a few MiB of CSV (~50 full-size files)
+PARALLEL_MIN_BYTES = 4 * 1024 * 1024
+
+# Per-file structure results, kept next to the data files. Bump the version
+# whenever the validation rules change so older results are discarded
+CACHE_FILENAME = '.validate_cache.json'
+CACHE_VERSION = 1
+
+
+def read_last_line(filepath: str) -> bytes:
+    """
+    Read the last non-empty line of a file without scanning all of it.
+    
+    The file is memory-mapped, so only the pages near the end are touched.
+    
+    Args:
+        filepath: Path to the file
+        
+    Returns:
+        The last non-empty line with surrounding whitespace removed, or b'' if none
+    """
+    with open(filepath, 'rb') as f:
+        # mmap cannot map an empty file
+        if os.fstat(f.fileno()).st_size == 0:
+            return b''
+        
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            # Skip trailing newlines and blank lines
+            end = len(mm)
+            while end > 0 and mm[end - 1:end].isspace():
+                end -= 1
+            start = mm.rfind(b'\n', 0, end) + 1
+            return mm[start:end].strip()
 
 
 class PineSeedsValidator:
@@ -19,17 +65,20 @@ class PineSeedsValidator:
         self.max_data_points = 6000
         self.required_columns = ['time', 'close']
         
-    def validate_csv_structure(self, filepath: str) -> Tuple[bool, List[str]]:
+    def validate_file(self, filepath: str, max_age_days: int = MAX_AGE_DAYS) -> Dict:
         """
-        Validate the basic structure of a CSV file.
+        Validate structure and freshness of a CSV file in a single pass.
         
         Args:
             filepath: Path to the CSV file
+            max_age_days: Maximum age of the latest data point in days
             
         Returns:
-            Tuple of (is_valid, list_of_errors)
+            Dictionary with 'valid', 'fresh', 'errors' and 'warnings' entries
         """
         errors = []
+        warnings = []
+        latest_timestamp = None
         
         try:
             with open(filepath, 'r') as csvfile:
@@ -38,7 +87,8 @@ class PineSeedsValidator:
                 
                 if not header:
                     errors.append("File is empty")
-                    return False, errors
+                    warnings.append("No data to check freshness")
+                    return self._result(errors, warnings, fresh=False)
                 
                 # Check required columns
                 if header != self.required_columns:
@@ -61,6 +111,7 @@ class PineSeedsValidator:
                         if timestamp <= prev_timestamp:
                             errors.append(f"Row {row_num}: Timestamps must be in ascending order")
                         prev_timestamp = timestamp
+                        latest_timestamp = timestamp
                     except ValueError:
                         errors.append(f"Row {row_num}: Invalid timestamp '{row[0]}'")
                     
@@ -81,12 +132,66 @@ class PineSeedsValidator:
         
         except FileNotFoundError:
             errors.append(f"File not found: {filepath}")
+            warnings.append("Error checking data freshness: file not found")
+            return self._result(errors, warnings, fresh=False)
         except Exception as e:
             errors.append(f"Error reading file: {str(e)}")
+            warnings.append(f"Error checking data freshness: {str(e)}")
+            return self._result(errors, warnings, fresh=False)
         
-        return len(errors) == 0, errors
+        fresh, freshness_warnings = self._check_freshness(latest_timestamp, max_age_days)
+        warnings.extend(freshness_warnings)
+        return self._result(errors, warnings, fresh=fresh)
     
-    def validate_data_freshness(self, filepath: str, max_age_days: int = 7) -> Tuple[bool, List[str]]:
+    @staticmethod
+    def _check_freshness(latest_timestamp: Optional[int], max_age_days: int) -> Tuple[bool, List[str]]:
+        """
+        Check the latest timestamp of a file against the maximum age.
+        
+        Args:
+            latest_timestamp: Latest unix timestamp in the file, or None if it has no data
+            max_age_days: Maximum age of the latest data point in days
+            
+        Returns:
+            Tuple of (is_fresh, list_of_warnings)
+        """
+        if latest_timestamp is None:
+            return False, ["No data to check freshness"]
+        
+        # Compare raw unix timestamps; stale once a full day past max_age_days
+        now = int(time.time())
+        cutoff = now - (max_age_days + 1) * SECONDS_PER_DAY
+        
+        if latest_timestamp <= cutoff:
+            age_days = (now - latest_timestamp) // SECONDS_PER_DAY
+            return False, [f"Data is {age_days} days old (max recommended: {max_age_days} days)"]
+        
+        return True, []
+    
+    @staticmethod
+    def _result(errors: List[str], warnings: List[str], fresh: bool) -> Dict:
+        """Build the per-file validation result dictionary."""
+        return {
+            'valid': len(errors) == 0,
+            'fresh': fresh,
+            'errors': errors,
+            'warnings': warnings
+        }
+    
+    def validate_csv_structure(self, filepath: str) -> Tuple[bool, List[str]]:
+        """
+        Validate the basic structure of a CSV file.
+        
+        Args:
+            filepath: Path to the CSV file
+            
+        Returns:
+            Tuple of (is_valid, list_of_errors)
+        """
+        result = self.validate_file(filepath)
+        return result['valid'], result['errors']
+    
+    def validate_data_freshness(self, filepath: str, max_age_days: int = MAX_AGE_DAYS) -> Tuple[bool, List[str]]:
         """
         Validate that the data is recent enough.
         
@@ -97,41 +202,29 @@ class PineSeedsValidator:
         Returns:
             Tuple of (is_valid, list_of_warnings)
         """
-        warnings = []
-        
+        # Only the last row matters, so read it from the end of the file
         try:
-            with open(filepath, 'r') as csvfile:
-                reader = csv.reader(csvfile)
-                next(reader)  # Skip header
-                
-                rows = list(reader)
-                if not rows:
-                    warnings.append("No data to check freshness")
-                    return False, warnings
-                
-                # Check the latest timestamp
-                latest_row = rows[-1]
-                latest_timestamp = int(latest_row[0])
-                latest_date = datetime.fromtimestamp(latest_timestamp)
-                now = datetime.now()
-                age_days = (now - latest_date).days
-                
-                if age_days > max_age_days:
-                    warnings.append(f"Data is {age_days} days old (max recommended: {max_age_days} days)")
-                    return False, warnings
-        
+            fields = read_last_line(filepath).decode().split(',')
+            if fields == [''] or fields == self.required_columns:
+                latest_timestamp = None
+            else:
+                latest_timestamp = int(fields[0])
         except Exception as e:
-            warnings.append(f"Error checking data freshness: {str(e)}")
-            return False, warnings
+            return False, [f"Error checking data freshness: {str(e)}"]
         
-        return True, warnings
+        return self._check_freshness(latest_timestamp, max_age_days)
     
-    def validate_all_files(self, data_dir: str = 'data') -> Dict[str, Dict]:
+    def validate_all_files(self, data_dir: str = 'data', use_cache: bool = True) -> Dict[str, Dict]:
         """
         Validate all CSV files in the data directory.
         
+        Valid structure results are cached by file mtime and size together
+        with the validator settings, so unchanged files only get their
+        freshness rechecked.
+        
         Args:
             data_dir: Directory containing CSV files
+            use_cache: Whether to read and update the validation cache
             
         Returns:
             Dictionary with validation results for each file
@@ -143,24 +236,112 @@ class PineSeedsValidator:
             return results
         
         csv_files = [f for f in os.listdir(data_dir) if f.endswith('.csv')]
+        stats = {filename: os.stat(os.path.join(data_dir, filename)) for filename in csv_files}
+        cache_path = os.path.join(data_dir, CACHE_FILENAME)
+        cache = self._load_cache(cache_path) if use_cache else {}
+        settings = self._cache_settings()
         
+        pending = []
         for filename in csv_files:
             filepath = os.path.join(data_dir, filename)
+            entry = cache.get(filename)
             
-            # Validate structure
-            is_valid, errors = self.validate_csv_structure(filepath)
-            
-            # Validate freshness
-            is_fresh, warnings = self.validate_data_freshness(filepath)
-            
-            results[filename] = {
-                'valid': is_valid,
-                'fresh': is_fresh,
-                'errors': errors,
-                'warnings': warnings
+            if (isinstance(entry, dict) and entry.get('settings') == settings
+                    and entry.get('mtime_ns') == stats[filename].st_mtime_ns
+                    and entry.get('size') == stats[filename].st_size):
+                # Unchanged file: reuse the structure result, freshness depends on today
+                is_fresh, warnings = self.validate_data_freshness(filepath)
+                results[filename] = {
+                    'valid': entry['valid'],
+                    'fresh': is_fresh,
+                    'errors': entry['errors'],
+                    'warnings': warnings
+                }
+            else:
+                pending.append(filepath)
+        
+        results.update(self._validate_files(pending))
+        
+        if use_cache:
+            # Only valid files are cached; invalid ones always get the full report
+            new_cache = {
+                filename: {
+                    'settings': settings,
+                    'mtime_ns': stats[filename].st_mtime_ns,
+                    'size': stats[filename].st_size,
+                    'valid': results[filename]['valid'],
+                    'errors': results[filename]['errors']
+                }
+                for filename in csv_files if results[filename]['valid']
             }
+            if new_cache != cache:
+                self._save_cache(cache_path, new_cache)
+        
+        return {filename: results[filename] for filename in csv_files}
+    
+    def _validate_files(self, filepaths: List[str]) -> Dict[str, Dict]:
+        """
+        Validate several files, in parallel worker processes when worthwhile.
+        
+        Args:
+            filepaths: Paths to the CSV files
+            
+        Returns:
+            Dictionary with validation results keyed by filename
+        """
+        validate_one = partial(_validate_one, self)
+        cpu_count = os.cpu_count() or 1
+        
+        if cpu_count == 1 or sum(map(os.path.getsize, filepaths)) < PARALLEL_MIN_BYTES:
+            # Starting worker processes costs more than validating small files
+            return dict(map(validate_one, filepaths))
+        
+        # Files are independent, so validate them in parallel
+        with ProcessPoolExecutor(max_workers=min(len(filepaths), cpu_count)) as executor:
+            return dict(executor.map(validate_one, filepaths))
+    
+    def _cache_settings(self) -> Dict:
+        """Return the settings a cached result depends on."""
+        return {
+            'version': CACHE_VERSION,
+            'max_data_points': self.max_data_points,
+            'required_columns': self.required_columns
+        }
+    
+    @staticmethod
+    def _load_cache(cache_path: str) -> Dict[str, Dict]:
+        """Load the validation cache, treating a missing or corrupt file as empty."""
+        try:
+            with open(cache_path, 'r') as cache_file:
+                cache = json.load(cache_file)
+        except (OSError, ValueError):
+            return {}
+        return cache if isinstance(cache, dict) else {}
+    
+    @staticmethod
+    def _save_cache(cache_path: str, cache: Dict[str, Dict]):
+        """Write the validation cache atomically; failures only cost a cache miss."""
+        tmp_path = f"{cache_path}.tmp"
+        try:
+            with open(tmp_path, 'w') as cache_file:
+                json.dump(cache, cache_file)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            print(f"Could not write validation cache: {e}")
+
+
+def _validate_one(validator: PineSeedsValidator, filepath: str) -> Tuple[str, Dict]:
+    """
+    Validate a single file; module-level so worker processes can unpickle it.
+    
+    Args:
+        validator: Validator holding the validation settings
+        filepath: Path to the CSV file
         
-        return results
+    Returns:
+        Tuple of (filename, validation_result)
+    """
+    return os.path.basename(filepath), validator.validate_file(filepath)
 
 
 def main():
@@ -10,10 +10,10 @@ import subprocess
 from pathlib import Path
 
 def run_command(command, description):
-    """Run a shell command and handle errors."""
+    """Run a command (shell string or argument list) and handle errors."""
     print(f"\n📋 {description}...")
     try:
-        result = subprocess.run(command, shell=True, check=True, capture_output=True, text=True)
+        result = subprocess.run(command, shell=isinstance(command, str), check=True, capture_output=True, text=True)
         print(f"✅ {description} completed successfully")
         if result.stdout:
             print(f"Output: {result.stdout.strip()}")
@@ -37,14 +37,16 @@ def install_dependencies():
     requirements = [
         "pytrends>=4.9.0",
         "pandas>=1.5.0", 
-        "requests>=2.28.0"
+        "requests>=2.28.0",
+        "requests-cache>=1.0.0"
     ]
     
     print("\n📦 Installing dependencies...")
-    for package in requirements:
-        if not run_command(f"pip install {package}", f"Installing {package}"):
-            return False
-    return True
+    # One pip invocation resolves all requirements together; passing a list
+    # skips the shell, which would also treat '>=' as a redirect
+    command = [sys.executable, "-m", "pip", "install",
+               "--disable-pip-version-check", "--no-input", *requirements]
+    return run_command(command, f"Installing {', '.join(requirements)}")
 
 def test_data_fetch():
     """Test the data fetching functionality."""
@@ -155,7 +157,7 @@ def main():
     # Install dependencies
     if not install_dependencies():
         print("\n❌ Failed to install dependencies. Please install manually:")
-        print("pip install pytrends pandas requests")
+        print("pip install pytrends pandas requests requests-cache")
         sys.exit(1)
     
     # Test data fetching